@@ -4,37 +4,101 @@ FastAPI server for generating product display content from Shopify data.
 Run with: uvicorn app:app --reload --port 8000
 """
 
+from contextlib import asynccontextmanager, contextmanager
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from dotenv import load_dotenv
 from langchain_anthropic import ChatAnthropic
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
+import anthropic
+import httpx
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+from selectolax.lexbor import LexborHTMLParser
+import orjson
+import asyncio
+import base64
+import hashlib
+import logging
 import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # Only needed by the optional semantic cache
+    np = None
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Timeout for Anthropic API calls: generous read timeout, fast connect failure
+ANTHROPIC_TIMEOUT = anthropic.Timeout(60.0, connect=5.0)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open one pooled HTTP/2 client for all Anthropic calls and (if enabled)
+    load the semantic cache; tear both down on shutdown.
+
+    ChatAnthropic has no option for a custom httpx client, so the model's
+    async Anthropic client is replaced with one built on the shared pool.
+    DefaultAsyncHttpxClient keeps the SDK's own defaults (keepalive socket
+    options, redirects) and matches whichever httpx build the SDK uses.
+    """
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=ANTHROPIC_TIMEOUT
+    )
+    llm._async_client = anthropic.AsyncClient(
+        **{**llm._client_params, "timeout": ANTHROPIC_TIMEOUT},
+        http_client=http_client
+    )
+    global semantic_cache
+    if SEMANTIC_CACHE_ENABLED:
+        semantic_cache = await asyncio.to_thread(SemanticCache, SEMANTIC_CACHE_PATH)
+    try:
+        yield
+    finally:
+        try:
+            if semantic_cache is not None:
+                await semantic_cache.save()
+        except Exception:
+            logger.exception("Saving the semantic cache failed")
+        finally:
+            await http_client.aclose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Product Content Generator API",
     description="Generate optimized product display content from Shopify product data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for Next.js app
 # Allow origins from environment variable or default to localhost
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
-cors_origins_list = [origin.strip() for origin in cors_origins.split(",")]
+cors_origins_list = [origin.strip() for origin in cors_origins.split(",") if origin.strip()]
 
+# Only the methods and headers this API uses; explicit lists avoid echoing
+# arbitrary request headers, and max_age lets browsers cache preflights for a day
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins_list,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["content-type", "authorization"],
+    max_age=86400,
 )
 
 # ProductContent model (same as in extract-shopify-features.py)
@@ -42,6 +106,8 @@ class ProductContent(BaseModel):
     """
     Generated product content for storefront display.
     """
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     displayName: str = Field(
         ...,
         description="Short, catchy product name optimized for product cards. Must be shorter than the original title. Should be 3-8 words, remove unnecessary words like 'Brand Name:', 'SPECIFICATIONS', etc. Focus on the core product benefit or key feature."
@@ -55,13 +121,15 @@ class ProductContent(BaseModel):
     bulletpoints: Optional[List[str]] = Field(
         default=None,
         max_length=5,
-        description="Key features, benefits, or specifications as bullet points. Only include if there is relevant, valuable information in the body_html. Each bullet should be concise (5-15 words). Focus on unique selling points, key ingredients, benefits, or important specifications. If body_html doesn't contain useful information, return empty list or null."
+        description="Key features, benefits, or specifications as bullet points. Only include if there is relevant, valuable information in the body text. Each bullet should be concise (5-15 words). Focus on unique selling points, key ingredients, benefits, or important specifications. If body text doesn't contain useful information, return empty list or null."
     )
 
 
 # Request model for the API endpoint
 class ProductRequest(BaseModel):
-    title: str = Field(..., description="Product title from Shopify")
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    title: str = Field(..., min_length=1, description="Product title from Shopify")
     body_html: str = Field(..., description="Product description HTML (truncated at 'src=' to exclude images)")
 
 
@@ -75,7 +143,7 @@ Your task is to generate optimized product content from Shopify product data:
 
 INPUT:
 - title: The original product title (may be long or contain unnecessary words)
-- body_html: Product description HTML content (may contain specifications, features, etc.)
+- body text: Product description as plain text, with HTML already removed (may contain specifications, features, etc.)
 
 OUTPUT REQUIREMENTS:
 
@@ -90,8 +158,8 @@ OUTPUT REQUIREMENTS:
 
 2. displayDescription:
    - Write 2-4 compelling sentences (50-150 words)
-   - ONLY describe what is explicitly stated in the title and body_html
-   - If body_html is minimal or empty, work with what you have from the title
+   - ONLY describe what is explicitly stated in the title and body text
+   - If body text is minimal or empty, work with what you have from the title
    - Do NOT invent features, benefits, or specifications that are not mentioned
    - If there's limited information, write a shorter but accurate description
    - Accuracy is more important than having a long description
@@ -99,15 +167,15 @@ OUTPUT REQUIREMENTS:
    - If input lacks usable info, it's acceptable to have a shorter description
 
 3. bulletpoints:
-   - ONLY include bullet points if body_html contains specific, extractable information
+   - ONLY include bullet points if body text contains specific, extractable information
    - DO NOT create bullet points from generic or obvious information
-   - DO NOT invent bullet points if body_html is empty or lacks detail
-   - If body_html has no useful information, return null or empty list []
+   - DO NOT invent bullet points if body text is empty or lacks detail
+   - If body text has no useful information, return null or empty list []
    - Maximum 5 bullet points, but only if you have 5 distinct pieces of information
    - If you only have 2 pieces of information, only create 2 bullet points
    - It's better to have fewer accurate bullet points than to make up information
    - Each bullet should be 5-15 words
-   - Each bullet must be directly derived from information in body_html
+   - Each bullet must be directly derived from information in body text
    - Each bullet should start with a capital letter and end without punctuation (unless it's a question)
 
 STRICT COMPLIANCE GUIDELINES:
@@ -122,11 +190,10 @@ STRICT COMPLIANCE GUIDELINES:
 - Example: Say "Moisturizing formula" not "Eliminates wrinkles and fine lines"
 
 ACCURACY GUIDELINES:
-- NEVER add information that is not in the title or body_html
+- NEVER add information that is not in the title or body text
 - NEVER assume product features, benefits, or specifications
-- If body_html is empty or minimal, create a description based ONLY on the title
-- If body_html has no extractable features, set bulletpoints to null or []
-- Remove HTML tags and formatting from body_html when extracting information
+- If body text is empty or minimal, create a description based ONLY on the title
+- If body text has no extractable features, set bulletpoints to null or []
 - Work with the information you have - incomplete information is acceptable, hallucinated information is not
 - Accuracy and truthfulness are the highest priorities
 - If input lacks usable info, it's okay to have less content - no need to make things up
@@ -135,24 +202,478 @@ Return the data in the ProductContent BaseModel format.
 """
 
 
-# Initialize LangChain components
-llm = ChatAnthropic(model="claude-3-haiku-20240307")
-parser = PydanticOutputParser(pydantic_object=ProductContent)
+# Worked examples appended to the system prompt. Besides guiding the model,
+# they keep the static prefix (tool schema + system prompt) above Anthropic's
+# minimum cacheable length, which is 4096 tokens for Haiku 4.5, so prompt
+# caching actually activates. Check the length stays above that when editing.
+FEW_SHOT_EXAMPLES = """
+EXAMPLES:
+
+Example 1 (rich body text):
+Title: Turmeric & Vitamin C Cream -Lightweight Nourishment for Face& Neck, Fast-Absorbing HydrationAll Skin Types
+Body text: SPECIFICATIONS Net Content: 50g Main Ingredients: Turmeric Extract, Vitamin C, Hyaluronic Acid, Shea Butter Suitable for: All skin types Texture: Lightweight cream, absorbs quickly without a greasy feel How to use: Apply a small amount to clean face and neck morning and evening.
+Output:
+{"displayName": "Turmeric & Vitamin C Cream", "displayDescription": "A lightweight face and neck cream made with turmeric extract, vitamin C, hyaluronic acid and shea butter. The fast-absorbing texture is designed for all skin types and leaves no greasy feel, making it easy to include in a morning and evening routine.", "bulletpoints": ["Contains turmeric extract, vitamin C and hyaluronic acid", "Lightweight texture that absorbs quickly without greasiness", "Suitable for all skin types", "Apply to clean face and neck morning and evening", "50g net content"]}
+
+Example 2 (empty body text):
+Title: Brand Name: LUXEHOME Minimalist Ceramic Flower Vase Matte White Nordic Decor
+Body text:
+Output:
+{"displayName": "Minimalist Ceramic Flower Vase", "displayDescription": "A minimalist flower vase in matte white ceramic. Nordic-style decor from the brand LUXEHOME.", "bulletpoints": null}
+
+Example 3 (body text with claims that must be softened):
+Title: Magnesium Glycinate Capsules 120 Count High Absorption Sleep Support Supplement
+Body text: Cures insomnia in just 3 days! 120 vegan capsules per bottle 400mg magnesium glycinate per serving Non-GMO, gluten free Made in a GMP certified facility
+Output:
+{"displayName": "Magnesium Glycinate Capsules", "displayDescription": "Magnesium glycinate capsules providing 400mg per serving in a 120-count bottle of vegan capsules. The formula is non-GMO and gluten free and is made in a GMP certified facility.", "bulletpoints": ["400mg magnesium glycinate per serving", "120 vegan capsules per bottle", "Non-GMO and gluten free", "Made in a GMP certified facility"]}
+
+Example 4 (long title, short body text):
+Title: 2024 New Arrival Women's Oversized Knit Cardigan Sweater Long Sleeve Open Front Chunky Cable Knit Outwear With Pockets Fall Winter
+Body text: Material: 100% Acrylic Sizes: S, M, L, XL Colors: Beige, Grey, Black
+Output:
+{"displayName": "Oversized Cable Knit Cardigan", "displayDescription": "An oversized women's cardigan in a chunky cable knit with long sleeves, an open front and pockets. Made from 100% acrylic and offered in beige, grey and black for fall and winter layering.", "bulletpoints": ["Made from 100% acrylic", "Available in sizes S, M, L and XL", "Offered in beige, grey and black"]}
+
+Example 5 (electronics with a specification list):
+Title: Wireless Bluetooth 5.3 Earbuds TWS Headphones Noise Cancelling ENC Mic 40H Playtime LED Display Charging Case IPX7 Waterproof Sport Earphones Black
+Body text: SPECIFICATIONS Bluetooth Version: 5.3 Battery Capacity (earbuds): 40mAh Battery Capacity (case): 400mAh Playtime: about 6 hours per charge, up to 40 hours with charging case Charging Port: Type-C Waterproof Rating: IPX7 Microphone: ENC dual microphones for calls Display: LED power display on the case Package Includes: 1 x Earbuds, 1 x Charging Case, 1 x Type-C Cable, 1 x User Manual
+Output:
+{"displayName": "Wireless Bluetooth 5.3 Earbuds", "displayDescription": "Wireless earbuds with Bluetooth 5.3 and ENC dual microphones for calls. Each charge gives about 6 hours of playtime, and the charging case with LED power display extends this to up to 40 hours. The IPX7 waterproof rating makes them suited to sports.", "bulletpoints": ["Bluetooth 5.3 with ENC dual microphones for calls", "About 6 hours per charge, up to 40 hours with case", "IPX7 waterproof rating", "LED power display and Type-C charging case", "Includes earbuds, charging case, Type-C cable and manual"]}
+
+Example 6 (pet product with marketing filler):
+Title: Pet Dog Cat Bed Round Plush Calming Donut Cuddler Anti-Anxiety Washable Non-Slip Bottom Small Medium Large Dogs Cats Kennel Mat
+Body text: Your furry friend deserves the BEST sleep ever!!! Our bed is simply amazing and every pet loves it. Material: Faux fur, PP cotton filling Bottom: Non-slip waterproof base Care: Machine washable on gentle cycle Sizes: 50cm, 60cm, 70cm, 80cm diameter
+Output:
+{"displayName": "Plush Donut Cuddler Pet Bed", "displayDescription": "A round plush donut-style bed for dogs and cats, made with a faux fur cover and PP cotton filling. It has a non-slip waterproof base, can be machine washed on a gentle cycle, and comes in several diameters for small to large pets.", "bulletpoints": ["Faux fur cover with PP cotton filling", "Non-slip waterproof base", "Machine washable on a gentle cycle", "Available in 50cm, 60cm, 70cm and 80cm diameters"]}
+
+Example 7 (skincare with medical claims in the body text):
+Title: Hyaluronic Acid Serum for Face 30ml Anti Aging Anti Wrinkle Moisturizing Facial Serum Dermatologist Recommended
+Body text: Clinically proven to erase wrinkles in 7 days! Heals acne scars and treats eczema. Volume: 30ml Key ingredients: Hyaluronic Acid, Niacinamide, Aloe Vera Leaf Juice Skin type: All skin types Usage: Apply 2-3 drops to clean skin morning and night, then follow with moisturizer
+Output:
+{"displayName": "Hyaluronic Acid Face Serum", "displayDescription": "A 30ml moisturizing face serum made with hyaluronic acid, niacinamide and aloe vera leaf juice. Designed for all skin types, it is applied as a few drops to clean skin morning and night before moisturizer.", "bulletpoints": ["Contains hyaluronic acid, niacinamide and aloe vera leaf juice", "Suitable for all skin types", "Apply 2-3 drops morning and night before moisturizer", "30ml volume"]}
+
+Example 8 (kitchen product, body text repeats the title):
+Title: Stainless Steel Kitchen Knife Set 8 Pieces with Wooden Block Chef Knife Bread Knife Santoku Utility Paring Knife Sharpener
+Body text: Stainless Steel Kitchen Knife Set 8 Pieces with Wooden Block
+Output:
+{"displayName": "8-Piece Stainless Steel Knife Set", "displayDescription": "An 8-piece stainless steel kitchen knife set stored in a wooden block. It includes a chef knife, bread knife, santoku knife, utility knife, paring knife and a sharpener.", "bulletpoints": null}
+
+Example 9 (jewelry with size and material details):
+Title: 925 Sterling Silver Dainty Heart Necklace Pendant for Women Girls Minimalist Jewelry Gift 18 Inch Chain Gold Plated
+Body text: Material: 925 Sterling Silver with 18K gold plating Pendant size: 10mm x 9mm Chain length: 16 inch + 2 inch extender Clasp: Lobster clasp Packaging: Comes in a gift box Nickel free and lead free
+Output:
+{"displayName": "Dainty Heart Pendant Necklace", "displayDescription": "A minimalist heart pendant necklace in 925 sterling silver with 18K gold plating. The 10mm pendant hangs on a 16 inch chain with a 2 inch extender and lobster clasp, and it arrives in a gift box.", "bulletpoints": ["925 sterling silver with 18K gold plating", "10mm x 9mm heart pendant", "16 inch chain with 2 inch extender", "Nickel free and lead free", "Comes in a gift box"]}
+
+Example 10 (children's toy with a safety statement):
+Title: Wooden Building Blocks Set 100 PCS Montessori Educational Toys for Toddlers 3 4 5 Years Old Boys Girls Stacking Blocks with Storage Bucket
+Body text: Set includes 100 wooden blocks in 10 shapes and 8 colors. Made from natural wood with water-based paint. Recommended age: 3 years and up. Comes with a plastic storage bucket with shape-sorting lid. WARNING: Choking hazard - small parts. Not for children under 3 years.
+Output:
+{"displayName": "100-Piece Wooden Building Blocks", "displayDescription": "A set of 100 wooden building blocks in 10 shapes and 8 colors, made from natural wood with water-based paint. The blocks come with a storage bucket that has a shape-sorting lid and are recommended for children aged 3 years and up.", "bulletpoints": ["100 blocks in 10 shapes and 8 colors", "Natural wood with water-based paint", "Storage bucket with shape-sorting lid", "Recommended for ages 3 and up; contains small parts"]}
+
+Example 11 (supplement with therapeutic claims and a serving table):
+Title: Organic Ashwagandha Root Powder Capsules 1300mg with Black Pepper Stress Relief Mood Support Anxiety Sleep 120 Capsules
+Body text: Reduces anxiety and cures stress naturally! Serving size: 2 capsules Servings per container: 60 Amount per serving: Organic Ashwagandha Root Powder 1300mg, Black Pepper Extract 10mg Other ingredients: Vegetable cellulose capsule Certified USDA Organic Third-party tested Directions: Take 2 capsules daily with water
+Output:
+{"displayName": "Organic Ashwagandha Root Capsules", "displayDescription": "Organic ashwagandha root powder capsules providing 1300mg per two-capsule serving, combined with 10mg of black pepper extract. Each container holds 120 vegetable cellulose capsules, or 60 servings. The product is certified USDA Organic and third-party tested.", "bulletpoints": ["1300mg organic ashwagandha root powder per serving", "10mg black pepper extract per serving", "120 capsules, 60 servings per container", "Certified USDA Organic and third-party tested", "Take 2 capsules daily with water"]}
+
+Example 12 (home decor, body text only lists care instructions):
+Title: Boho Macrame Wall Hanging Large Woven Tapestry Handmade Cotton Rope Wall Decor for Bedroom Living Room Nursery 80x100cm
+Body text: Care: Spot clean only. Do not machine wash.
+Output:
+{"displayName": "Boho Macrame Wall Hanging", "displayDescription": "A large handmade boho macrame wall hanging woven from cotton rope, measuring 80x100cm. A decorative piece suited to bedrooms, living rooms and nurseries; spot clean only.", "bulletpoints": ["Spot clean only, do not machine wash"]}
+
+Example 13 (variant listing, colour and size in the title):
+Title: Men's Classic Crew Neck Cotton T-Shirt Short Sleeve Regular Fit Basic Tee - Navy Blue, Size L
+Body text: Fabric: 100% combed cotton, 180 GSM Fit: Regular fit Neckline: Ribbed crew neck Care: Machine wash cold, tumble dry low
+Output:
+{"displayName": "Men's Classic Crew Neck Tee", "displayDescription": "A men's short-sleeve crew neck t-shirt in 180 GSM combed cotton with a regular fit and ribbed neckline. This listing is the navy blue version in size L, and it can be machine washed cold and tumble dried low.", "bulletpoints": ["100% combed cotton, 180 GSM", "Regular fit with ribbed crew neck", "Machine wash cold, tumble dry low"]}
+
+Example 14 (body text in note form with unit codes):
+Title: LED Desk Lamp Dimmable Eye-Caring Reading Light USB Charging Port 5 Color Modes 10 Brightness Levels Touch Control Foldable Office Home Model DL-2207
+Body text: Power: 12W. Input: DC 12V/1A. Color temp: 3000K-6500K (5 modes). Brightness: 10 levels. Control: touch panel. USB-A output port 5V/1A for phone charging. Auto-off timer: 60 min. Foldable arm, 3 joints.
+Output:
+{"displayName": "Dimmable Foldable LED Desk Lamp", "displayDescription": "A foldable 12W LED desk lamp with touch controls, five color modes from 3000K to 6500K and ten brightness levels. It has a USB-A port for charging a phone and a 60-minute auto-off timer.", "bulletpoints": ["5 color modes from 3000K to 6500K", "10 brightness levels with touch control", "USB-A output port for phone charging", "60-minute auto-off timer", "Foldable arm with 3 joints"]}
+
+Example 15 (outdoor gear with measurements in mixed units):
+Title: Camping Hammock Double Portable Lightweight Nylon Parachute Hammock with Tree Straps Carabiners for Backpacking Travel Beach Yard 2 Person
+Body text: Fabric: 210T parachute nylon Open size: 270 x 140 cm (106 x 55 in) Max load: 200 kg (440 lbs) Packed size: 16 x 13 cm Weight: 600 g Included: 2 tree straps (each 3 m long) and 2 steel carabiners Setup: no tools required
+Output:
+{"displayName": "Double Parachute Nylon Camping Hammock", "displayDescription": "A portable two-person camping hammock made from 210T parachute nylon, measuring 270 x 140 cm when open and supporting up to 200 kg. It packs down to 16 x 13 cm, weighs 600 g and comes with two 3 m tree straps and two steel carabiners for setup without tools.", "bulletpoints": ["210T parachute nylon, 270 x 140 cm open", "Maximum load of 200 kg (440 lbs)", "Packs to 16 x 13 cm and weighs 600 g", "Includes two 3 m tree straps and two carabiners"]}
+
+Example 16 (beauty tool, vague body text with no specifics):
+Title: Jade Roller and Gua Sha Set Face Massager Natural Stone Facial Roller Skin Care Tool Beauty Gift for Women
+Body text: The perfect addition to your self-care routine. Treat yourself or someone you love. High quality. Great gift idea.
+Output:
+{"displayName": "Jade Roller and Gua Sha Set", "displayDescription": "A facial roller and gua sha set made from natural stone for use as part of a skin care routine. Presented as a beauty gift set.", "bulletpoints": null}
+
+Example 17 (phone accessory with compatibility list):
+Title: Magnetic Phone Case for iPhone 15 Pro Max Clear Shockproof Compatible with MagSafe Anti-Yellowing Slim Cover Military Grade Drop Protection
+Body text: Compatibility: iPhone 15 Pro Max only (6.7 inch). Material: polycarbonate back with TPU bumper. Built-in magnets compatible with MagSafe chargers and accessories. Raised edges around the screen and camera. Drop tested from 10 ft. Anti-yellowing coating.
+Output:
+{"displayName": "Clear Magnetic iPhone 15 Pro Max Case", "displayDescription": "A slim, clear case for the iPhone 15 Pro Max with built-in magnets that work with MagSafe chargers and accessories. It combines a polycarbonate back with a TPU bumper, has raised edges around the screen and camera, and has been drop tested from 10 ft.", "bulletpoints": ["Fits iPhone 15 Pro Max (6.7 inch) only", "Built-in magnets compatible with MagSafe", "Polycarbonate back with TPU bumper", "Raised edges around screen and camera", "Drop tested from 10 ft with anti-yellowing coating"]}
+
+Note how Examples 3, 7 and 11 drop claims such as "Cures insomnia" or "erase wrinkles" instead of repeating them, and how Examples 2, 8 and 16 return null bulletpoints because the body text is empty, only repeats the title, or has no specific information. Example 12 uses the material and size from the title in the description, but its only bullet point is the care instruction, because that is the one fact the body text states.
+"""
 
-# Create the prompt template
-prompt = ChatPromptTemplate.from_messages([
-    ("system", "You are an expert e-commerce copywriter. You must ONLY use information provided in the product data. Do NOT hallucinate or invent information. Prioritize accuracy and compliance over marketing flair. Avoid health claims that could trigger platform flags. Format your response as JSON."),
-    ("human", "{instructions}\n\nPRODUCT DATA:\nTitle: {title}\nBody HTML: {body_html}\n\nIMPORTANT: Only use information from the Title and Body HTML above. Do not add any information that is not explicitly stated. If information is missing, work with what you have. Accuracy is more important than completeness. Avoid health claims and prioritize compliance.\n\n{format_instructions}")
-])
+SYSTEM_PROMPT = "You are an expert e-commerce copywriter. You must ONLY use information provided in the product data. Do NOT hallucinate or invent information. Prioritize accuracy and compliance over marketing flair. Avoid health claims that could trigger platform flags. Return your answer with the ProductContent tool."
+
+
+# Initialize LangChain components once at import time; the lifespan handler
+# attaches the pooled HTTP client before the first request
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-haiku-4-5")
+llm = ChatAnthropic(model=ANTHROPIC_MODEL)
+
+# Structured output via Claude tool use: the model is forced to call a
+# ProductContent tool, so no JSON format instructions are needed in the prompt
+# and there is no post-hoc parsing step that can fail.
+structured_llm = llm.with_structured_output(ProductContent, method="function_calling")
 
-# Partial the prompt with instructions and format_instructions
-prompt = prompt.partial(
-    instructions=LLM_INSTRUCTIONS,
-    format_instructions=parser.get_format_instructions()
+# Same tool call for /generate/stream, parsed into partial dicts as the tool
+# input streams in (a Pydantic parser can only validate the finished object)
+streaming_llm = llm.bind_tools([ProductContent], tool_choice="ProductContent") | JsonOutputKeyToolsParser(
+    key_name="ProductContent",
+    first_tool_only=True
 )
 
-# Create the chain
-chain = prompt | llm | parser
+# The whole static prefix lives in one system block marked with cache_control,
+# so Anthropic can reuse it (together with the tool schema, which precedes the
+# system prompt) across requests. It is rendered once here, so it is
+# byte-identical between calls; only the human turn built in build_messages,
+# placed after the cache breakpoint, changes per product.
+SYSTEM_CONTENT = f"{SYSTEM_PROMPT}\n{LLM_INSTRUCTIONS}\n{FEW_SHOT_EXAMPLES}"
+system_message = SystemMessage(content=[
+    {
+        "type": "text",
+        "text": SYSTEM_CONTENT,
+        "cache_control": {"type": "ephemeral"},
+    }
+])
+
+PRODUCT_DATA_REMINDER = "IMPORTANT: Only use information from the Title and Body text above. Do not add any information that is not explicitly stated. If information is missing, work with what you have. Accuracy is more important than completeness. Avoid health claims and prioritize compliance."
+
+
+def build_messages(title: str, body_text: str) -> list:
+    """Build the message list for one product; no template rendering on the hot path."""
+    return [
+        system_message,
+        HumanMessage(content=f"PRODUCT DATA:\nTitle: {title}\nBody text: {body_text}\n\n{PRODUCT_DATA_REMINDER}")
+    ]
+
+# body_html is reduced to plain text before it reaches the LLM: tags and inline
+# styles carry no meaning for the copy but can inflate input tokens several times
+BODY_TEXT_MAX_CHARS = int(os.getenv("BODY_TEXT_MAX_CHARS", 4000))
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def strip_html(body_html: str) -> str:
+    """Convert body_html to whitespace-collapsed text, truncated to BODY_TEXT_MAX_CHARS."""
+    tree = LexborHTMLParser(body_html)
+    tree.strip_tags(["script", "style"])
+    text = WHITESPACE_RE.sub(" ", tree.text(separator=" ")).strip()
+    return text[:BODY_TEXT_MAX_CHARS]
+
+
+# Sparse products (short title, next to no body text) are answered without the
+# LLM: there is nothing for it to extract, so the output is built from the title
+SHORT_CIRCUIT_MAX_BODY_CHARS = 40
+SHORT_CIRCUIT_MAX_TITLE_WORDS = 8
+SHORT_TITLE_MAX_WORDS = 6
+TITLE_NOISE_RE = re.compile(r"\b(?:brand\s+name|specifications?)\b\s*:?", re.IGNORECASE)
+TITLE_SEPARATOR_RE = re.compile(r"\s[-|\u2013]\s|,")
+short_circuit_count = 0
+
+
+def is_sparse_product(title: str, body_text: str) -> bool:
+    """Return True when the product has too little information to send to the LLM."""
+    return len(body_text) < SHORT_CIRCUIT_MAX_BODY_CHARS and len(title.split()) <= SHORT_CIRCUIT_MAX_TITLE_WORDS
+
+
+def shorten_title(title: str) -> str:
+    """
+    Shorten a title into a displayName without the LLM.
+
+    Drops labels like "Brand Name:" and "SPECIFICATIONS", cuts variant details
+    after a separator (" - ", " | ", ","), and caps the result at
+    SHORT_TITLE_MAX_WORDS words. Falls back to the whole title if nothing
+    else is left.
+    """
+    text = " ".join(TITLE_NOISE_RE.sub(" ", title).split())
+    head = TITLE_SEPARATOR_RE.split(text, maxsplit=1)[0].strip()
+    if len(head.split()) >= 2:
+        text = head
+    words = text.split()[:SHORT_TITLE_MAX_WORDS]
+    return " ".join(words) or " ".join(title.split())
+
+
+def sparse_product_content(title: str) -> ProductContent:
+    """Build ProductContent for a sparse product deterministically from its title."""
+    return ProductContent(
+        displayName=shorten_title(title),
+        displayDescription=" ".join(title.split()),
+        bulletpoints=None
+    )
+
+
+# Response cache for repeated products (e.g. Shopify re-syncs and retries).
+# Values are ProductContent.model_dump() dicts of already-validated output, so
+# hits are rebuilt with model_construct instead of being validated again.
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", 10_000))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+response_cache_lock = asyncio.Lock()
+response_cache_stats = {"hits": 0, "misses": 0}
+
+
+def response_cache_key(request: ProductRequest) -> bytes:
+    """Hash title and body_html into a compact cache key."""
+    data = f"{request.title}\x00{request.body_html}".encode()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# Semantic cache: near-duplicate products (size/color variants) reuse an earlier
+# response when their embeddings are close enough. Outputs become approximate,
+# so it is off unless SEMANTIC_CACHE=1. Requires fastembed and hnswlib.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_PATH = Path(os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache"))
+SEMANTIC_CACHE_FILE = "cache.json"
+SEMANTIC_CACHE_MODEL = "BAAI/bge-small-en-v1.5"
+SEMANTIC_CACHE_DIM = 384
+SEMANTIC_CACHE_MAX_ELEMENTS = 100_000
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", 0.03))
+SEMANTIC_CACHE_TTL = 24 * 3600
+semantic_cache = None
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """Hold an exclusive lock on lock_path (no-op where fcntl is unavailable)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SemanticCache:
+    """
+    Approximate response cache over an HNSW index of product embeddings.
+
+    In memory, entries map an index label to (entry_id, created_at,
+    ProductContent dict); entry_id is a hash of the embedding, so the same
+    product gets the same id in every worker. Expired or evicted labels are
+    marked deleted in the index and their slots reused.
+
+    On disk, the cache is a single JSON file of records that carry their own
+    vector, so the index is rebuilt on load and labels never have to match
+    between processes. Workers share the file: save() merges with what is
+    already there under a file lock and replaces it atomically.
+    """
+
+    def __init__(self, path: Path, model=None):
+        import hnswlib
+
+        if model is None:
+            from fastembed import TextEmbedding
+            model = TextEmbedding(SEMANTIC_CACHE_MODEL)
+
+        self.path = path
+        self.model = model
+        self.index = hnswlib.Index(space="cosine", dim=SEMANTIC_CACHE_DIM)
+        self.index.init_index(max_elements=SEMANTIC_CACHE_MAX_ELEMENTS, allow_replace_deleted=True)
+        self.entries = {}
+        self.labels_by_id = {}
+        self.next_label = 0
+        self.lock = asyncio.Lock()
+        self.hits = 0
+
+        for record in sorted(self._read_records().values(), key=lambda record: record["created_at"]):
+            vector = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32)
+            self._insert(record["id"], record["created_at"], vector, record["content"])
+
+    def _read_records(self) -> dict:
+        """
+        Load unexpired records from the cache file, keyed by entry id.
+
+        Records with a missing field or a vector of the wrong size are
+        skipped; an unreadable file is treated as empty.
+        """
+        cache_file = self.path / SEMANTIC_CACHE_FILE
+        if not cache_file.exists():
+            return {}
+        try:
+            data = orjson.loads(cache_file.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            logger.warning("Ignoring unreadable semantic cache file %s", cache_file)
+            return {}
+
+        cutoff = time.time() - SEMANTIC_CACHE_TTL
+        records = {}
+        for record in data.get("entries", []) if isinstance(data, dict) else []:
+            try:
+                vector_size = len(base64.b64decode(record["vector"]))
+                valid = (
+                    isinstance(record["id"], str)
+                    and isinstance(record["content"], dict)
+                    and record["created_at"] >= cutoff
+                    and vector_size == SEMANTIC_CACHE_DIM * 4
+                )
+            except (KeyError, TypeError, ValueError):
+                valid = False
+            if valid:
+                records[record["id"]] = record
+        return records
+
+    def _insert(self, entry_id: str, created_at: float, vector, content: dict):
+        """Add one entry, replacing an older copy and evicting the oldest when full."""
+        if entry_id in self.labels_by_id:
+            self._remove(self.labels_by_id[entry_id])
+        if len(self.entries) >= SEMANTIC_CACHE_MAX_ELEMENTS:
+            self._remove(next(iter(self.entries)))
+        label = self.next_label
+        self.next_label += 1
+        self.index.add_items(np.asarray([vector], dtype=np.float32), [label], replace_deleted=True)
+        self.entries[label] = (entry_id, created_at, content)
+        self.labels_by_id[entry_id] = label
+
+    def _remove(self, label: int):
+        """Drop an entry and free its index slot."""
+        entry_id, _, _ = self.entries.pop(label)
+        del self.labels_by_id[entry_id]
+        self.index.mark_deleted(label)
+
+    def _expire(self):
+        """Drop entries older than SEMANTIC_CACHE_TTL (oldest first)."""
+        cutoff = time.time() - SEMANTIC_CACHE_TTL
+        for label, (_, created_at, _) in list(self.entries.items()):
+            if created_at >= cutoff:
+                break
+            self._remove(label)
+
+    def _save(self):
+        """Merge this worker's entries into the cache file and replace it atomically."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path / f"{SEMANTIC_CACHE_FILE}.lock"):
+            records = self._read_records()
+            for label, (entry_id, created_at, content) in self.entries.items():
+                existing = records.get(entry_id)
+                if existing is not None and existing["created_at"] >= created_at:
+                    continue
+                vector = np.asarray(self.index.get_items([label]), dtype=np.float32)[0]
+                records[entry_id] = {
+                    "id": entry_id,
+                    "created_at": created_at,
+                    "vector": base64.b64encode(vector.tobytes()).decode(),
+                    "content": content
+                }
+            newest = sorted(records.values(), key=lambda record: record["created_at"])[-SEMANTIC_CACHE_MAX_ELEMENTS:]
+
+            fd, tmp_name = tempfile.mkstemp(dir=self.path, prefix=f"{SEMANTIC_CACHE_FILE}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tmp_file:
+                    tmp_file.write(orjson.dumps({"entries": newest}))
+                os.replace(tmp_name, self.path / SEMANTIC_CACHE_FILE)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+
+    async def embed(self, title: str, body_text: str):
+        """Embed the title and the start of the body text off the event loop."""
+        text = f"{title}\n{body_text[:500]}"
+        return await asyncio.to_thread(lambda: next(iter(self.model.embed([text]))))
+
+    async def get(self, vector) -> Optional[dict]:
+        """Return the cached ProductContent dict of the nearest product, if close enough."""
+        async with self.lock:
+            self._expire()
+            if not self.entries:
+                return None
+            labels, distances = self.index.knn_query(vector, k=1)
+            entry = self.entries.get(int(labels[0][0]))
+            if entry is None or distances[0][0] > SEMANTIC_CACHE_MAX_DISTANCE:
+                return None
+            self.hits += 1
+            return entry[2]
+
+    async def add(self, vector, content: dict):
+        """Store a response for the product the vector was embedded from."""
+        vector = np.asarray(vector, dtype=np.float32)
+        entry_id = hashlib.blake2b(vector.tobytes(), digest_size=16).hexdigest()
+        async with self.lock:
+            self._insert(entry_id, time.time(), vector, content)
+
+    async def save(self):
+        """Persist the cache to self.path, merged with other workers' entries."""
+        async with self.lock:
+            await asyncio.to_thread(self._save)
+
+
+async def semantic_cache_lookup(title: str, body_text: str):
+    """
+    Embed a product and look it up in the semantic cache.
+
+    Returns (vector, cached ProductContent dict or None). Cache failures are
+    logged and treated as a miss so they never fail the request.
+    """
+    if semantic_cache is None:
+        return None, None
+    try:
+        vector = await semantic_cache.embed(title, body_text)
+        return vector, await semantic_cache.get(vector)
+    except Exception:
+        logger.exception("Semantic cache lookup failed")
+        return None, None
+
+
+async def semantic_cache_store(vector, content: dict):
+    """Store a response in the semantic cache, logging instead of raising on failure."""
+    if semantic_cache is None or vector is None:
+        return
+    try:
+        await semantic_cache.add(vector, content)
+    except Exception:
+        logger.exception("Semantic cache insert failed")
+
+
+async def lookup_product_content(request: ProductRequest, body_text: str, no_cache: bool):
+    """
+    Answer a request without the LLM where possible, shared by both endpoints.
+
+    Tries the sparse-product short-circuit, then the response cache, then the
+    semantic cache (both caches are skipped when no_cache is set). Returns
+    (ProductContent dict or None, response cache key, embedding vector); on a
+    miss, pass the key and vector to store_product_content with the result.
+    """
+    global short_circuit_count
+    if is_sparse_product(request.title, body_text):
+        short_circuit_count += 1
+        logger.info("Sparse product answered without LLM (%d so far)", short_circuit_count)
+        return sparse_product_content(request.title).model_dump(), None, None
+
+    key = response_cache_key(request)
+    if no_cache:
+        return None, key, None
+
+    async with response_cache_lock:
+        cached = response_cache.get(key)
+        if cached is not None:
+            response_cache_stats["hits"] += 1
+            return cached, key, None
+        response_cache_stats["misses"] += 1
+
+    vector, similar = await semantic_cache_lookup(request.title, body_text)
+    return similar, key, vector
+
+
+async def store_product_content(key: str, vector, content: dict):
+    """Store a generated response in the response cache and the semantic cache."""
+    async with response_cache_lock:
+        response_cache[key] = content
+    await semantic_cache_store(vector, content)
 
 
 @app.get("/")
@@ -163,29 +684,59 @@ async def root():
         "status": "running",
         "endpoints": {
             "generate": "/generate (POST)",
+            "generate_stream": "/generate/stream (POST)",
+            "cache_stats": "/cache/stats (GET)",
             "health": "/ (GET)"
         }
     }
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache size and hit ratio"""
+    hits = response_cache_stats["hits"]
+    misses = response_cache_stats["misses"]
+    lookups = hits + misses
+    return {
+        "size": len(response_cache),
+        "maxsize": response_cache.maxsize,
+        "ttl": response_cache.ttl,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / lookups if lookups else 0.0,
+        "semantic": {
+            "size": len(semantic_cache.entries),
+            "hits": semantic_cache.hits
+        } if semantic_cache is not None else None
+    }
+
+
 @app.post("/generate", response_model=ProductContent)
-async def generate_product_content(request: ProductRequest):
+async def generate_product_content(request: ProductRequest, no_cache: bool = False):
     """
     Generate optimized product display content from Shopify product data.
     
     Args:
         request: ProductRequest containing title and body_html
+        no_cache: Skip the response cache and always call the LLM
     
     Returns:
         ProductContent with displayName, displayDescription, and bulletpoints
     """
+    body_text = strip_html(request.body_html)
+    cached, key, vector = await lookup_product_content(request, body_text, no_cache)
+    if cached is not None:
+        # Cached data was validated when it was stored; skip re-validation
+        return ProductContent.model_construct(**cached)
+
     try:
-        # Invoke the LangChain chain
-        result = chain.invoke({
-            "title": request.title,
-            "body_html": request.body_html
-        })
+        # Invoke the model without blocking the event loop
+        result = await structured_llm.ainvoke(
+            build_messages(request.title, body_text)
+        )
         
+        await store_product_content(key, vector, result.model_dump())
+
         return result
         
     except Exception as e:
@@ -195,8 +746,64 @@ async def generate_product_content(request: ProductRequest):
         )
 
 
+def ndjson_line(data) -> bytes:
+    """Serialize one NDJSON line with orjson."""
+    return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+
+@app.post("/generate/stream")
+async def generate_product_content_stream(request: ProductRequest, no_cache: bool = False):
+    """
+    Stream product display content as newline-delimited JSON.
+
+    Each line is a snapshot of the ProductContent fields generated so far, so
+    clients can render displayName before bulletpoints are complete. The last
+    line is the complete, validated object. Errors after the stream has
+    started are sent as a final {"error": ...} line.
+
+    Args:
+        request: ProductRequest containing title and body_html
+        no_cache: Skip the response and semantic caches and always call the LLM
+
+    Returns:
+        StreamingResponse with media type application/x-ndjson
+    """
+    body_text = strip_html(request.body_html)
+
+    async def ndjson_lines():
+        cached, key, vector = await lookup_product_content(request, body_text, no_cache)
+        if cached is not None:
+            yield ndjson_line(cached)
+            return
+
+        try:
+            last = None
+            async for partial in streaming_llm.astream(build_messages(request.title, body_text)):
+                if partial and partial != last:
+                    last = partial
+                    yield ndjson_line(partial)
+
+            result = ProductContent(**(last or {}))
+            await store_product_content(key, vector, result.model_dump())
+            yield ndjson_line(result.model_dump())
+
+        except Exception as e:
+            yield ndjson_line({"error": f"Error generating product content: {str(e)}"})
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Workers need an import string rather than the app object; each worker
+    # imports the module itself and opens its own HTTP pool in lifespan
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WEB_CONCURRENCY", "2")),
+        loop="uvloop",
+        http="httptools"
+    )
 
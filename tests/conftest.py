@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# app.py lives at the repository root and builds its ChatAnthropic client at import
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+SPARSE = {"title": "Ceramic Vase", "body_html": "<p></p>"}
+FULL = {"title": "Ceramic Vase", "body_html": "<p>Material: stoneware. Height: 20cm. Matte white glaze, hand finished.</p>"}
+CACHED = {"displayName": "Cached Vase", "displayDescription": "From the cache.", "bulletpoints": None}
+
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    app.response_cache.clear()
+    monkeypatch.setattr(app, "response_cache_stats", {"hits": 0, "misses": 0})
+    monkeypatch.setattr(app, "short_circuit_count", 0)
+    monkeypatch.setattr(app, "semantic_cache", None)
+    yield
+    app.response_cache.clear()
+
+
+@pytest.fixture
+def client():
+    # No `with` block: the lifespan (and its HTTP pool) is not needed here
+    return TestClient(app.app)
+
+
+@pytest.mark.parametrize("path", ["/generate", "/generate/stream"])
+def test_sparse_product_counted_on_both_endpoints(client, path):
+    response = client.post(path, json=SPARSE)
+    assert response.status_code == 200
+    assert app.short_circuit_count == 1
+    assert app.response_cache_stats == {"hits": 0, "misses": 0}
+
+
+@pytest.mark.parametrize("path", ["/generate", "/generate/stream"])
+def test_cache_hit_counted_on_both_endpoints(client, path):
+    app.response_cache[app.response_cache_key(app.ProductRequest(**FULL))] = CACHED
+    response = client.post(path, json=FULL)
+    assert response.status_code == 200
+    assert response.json() == CACHED
+    assert app.response_cache_stats == {"hits": 1, "misses": 0}
+
+
+def test_lookup_miss_returns_key_for_store():
+    request = app.ProductRequest(**FULL)
+    body_text = app.strip_html(request.body_html)
+    cached, key, vector = asyncio.run(app.lookup_product_content(request, body_text, no_cache=False))
+    assert (cached, key, vector) == (None, app.response_cache_key(request), None)
+    assert app.response_cache_stats == {"hits": 0, "misses": 1}
+
+    asyncio.run(app.store_product_content(key, vector, CACHED))
+    assert asyncio.run(app.lookup_product_content(request, body_text, no_cache=False))[0] == CACHED
+
+
+def test_lookup_no_cache_skips_caches():
+    request = app.ProductRequest(**FULL)
+    app.response_cache[app.response_cache_key(request)] = CACHED
+    cached, key, vector = asyncio.run(
+        app.lookup_product_content(request, app.strip_html(request.body_html), no_cache=True)
+    )
+    assert cached is None and key == app.response_cache_key(request)
+    assert app.response_cache_stats == {"hits": 0, "misses": 0}
+
+
+def test_lifespan_closes_http_client_when_cache_save_fails(monkeypatch):
+    class FailingCache:
+        async def save(self):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(app, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(app, "semantic_cache", FailingCache())
+    monkeypatch.setattr(app.llm, "_async_client", app.llm._async_client)
+
+    async def run():
+        async with app.lifespan(app.app):
+            client = app.llm._async_client
+        return client
+
+    assert asyncio.run(run())._client.is_closed
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("hnswlib")
+
+import app
+
+
+class FakeEmbedding:
+    """Stands in for fastembed so tests don't download a model."""
+
+    def embed(self, texts):
+        for text in texts:
+            yield unit_vector(sum(map(ord, text)))
+
+
+def unit_vector(seed, nudge=None):
+    vector = np.random.default_rng(seed).normal(size=app.SEMANTIC_CACHE_DIM).astype(np.float32)
+    if nudge is not None:
+        vector += nudge * np.random.default_rng(seed + 1).normal(size=app.SEMANTIC_CACHE_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def content(name):
+    return {"displayName": name, "displayDescription": f"{name} description", "bulletpoints": None}
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make():
+        return app.SemanticCache(tmp_path, model=FakeEmbedding())
+    return make
+
+
+def test_returns_close_match_only(make_cache):
+    cache = make_cache()
+    asyncio.run(cache.add(unit_vector(1), content("Red Tee")))
+
+    assert asyncio.run(cache.get(unit_vector(1, nudge=0.01))) == content("Red Tee")
+    assert asyncio.run(cache.get(unit_vector(2))) is None
+    assert cache.hits == 1
+
+
+def test_embed_uses_title_and_body(make_cache):
+    cache = make_cache()
+    vector = asyncio.run(cache.embed("Red Tee", "Cotton"))
+
+    assert vector.shape == (app.SEMANTIC_CACHE_DIM,)
+
+
+def test_same_vector_replaces_entry(make_cache):
+    cache = make_cache()
+    asyncio.run(cache.add(unit_vector(1), content("Old")))
+    asyncio.run(cache.add(unit_vector(1), content("New")))
+
+    assert len(cache.entries) == 1
+    assert asyncio.run(cache.get(unit_vector(1))) == content("New")
+
+
+def test_entries_expire_after_ttl(make_cache, monkeypatch):
+    cache = make_cache()
+    now = 1_000_000.0
+    monkeypatch.setattr(app.time, "time", lambda: now)
+    asyncio.run(cache.add(unit_vector(1), content("Red Tee")))
+
+    now += app.SEMANTIC_CACHE_TTL + 1
+
+    assert asyncio.run(cache.get(unit_vector(1))) is None
+    assert cache.entries == {}
+
+
+def test_oldest_entry_evicted_when_full(make_cache, monkeypatch):
+    monkeypatch.setattr(app, "SEMANTIC_CACHE_MAX_ELEMENTS", 2)
+    cache = make_cache()
+    for seed in (1, 2, 3):
+        asyncio.run(cache.add(unit_vector(seed), content(f"Product {seed}")))
+
+    assert len(cache.entries) == 2
+    assert asyncio.run(cache.get(unit_vector(1))) is None
+    assert asyncio.run(cache.get(unit_vector(3))) == content("Product 3")
+
+
+def test_save_and_reload(make_cache):
+    cache = make_cache()
+    asyncio.run(cache.add(unit_vector(1), content("Red Tee")))
+    asyncio.run(cache.add(unit_vector(2), content("Knife Set")))
+    asyncio.run(cache.save())
+
+    reloaded = make_cache()
+
+    assert len(reloaded.entries) == 2
+    assert asyncio.run(reloaded.get(unit_vector(1, nudge=0.01))) == content("Red Tee")
+    assert asyncio.run(reloaded.get(unit_vector(2, nudge=0.01))) == content("Knife Set")
+
+
+def test_saves_from_two_workers_are_merged(make_cache):
+    worker_a = make_cache()
+    worker_b = make_cache()
+    asyncio.run(worker_a.add(unit_vector(1), content("Red Tee")))
+    asyncio.run(worker_b.add(unit_vector(2), content("Knife Set")))
+    asyncio.run(worker_a.save())
+    asyncio.run(worker_b.save())
+
+    reloaded = make_cache()
+
+    assert asyncio.run(reloaded.get(unit_vector(1))) == content("Red Tee")
+    assert asyncio.run(reloaded.get(unit_vector(2))) == content("Knife Set")
+
+
+def test_expired_records_are_dropped_on_load(make_cache, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(app.time, "time", lambda: now)
+    cache = make_cache()
+    asyncio.run(cache.add(unit_vector(1), content("Red Tee")))
+    asyncio.run(cache.save())
+
+    now += app.SEMANTIC_CACHE_TTL + 1
+
+    assert make_cache().entries == {}
+
+
+def test_unreadable_file_is_ignored(make_cache, tmp_path):
+    (tmp_path / app.SEMANTIC_CACHE_FILE).write_text("{not json")
+
+    assert make_cache().entries == {}
+
+
+def test_invalid_records_are_skipped(make_cache, tmp_path):
+    cache = make_cache()
+    asyncio.run(cache.add(unit_vector(1), content("Red Tee")))
+    asyncio.run(cache.save())
+    data = app.orjson.loads((tmp_path / app.SEMANTIC_CACHE_FILE).read_bytes())
+    data["entries"].append({"id": "short", "created_at": data["entries"][0]["created_at"], "vector": "AAAA", "content": content("Bad")})
+    data["entries"].append({"id": "missing-content", "created_at": 0})
+    (tmp_path / app.SEMANTIC_CACHE_FILE).write_bytes(app.orjson.dumps(data))
+
+    reloaded = make_cache()
+
+    assert len(reloaded.entries) == 1
+    assert asyncio.run(reloaded.get(unit_vector(1))) == content("Red Tee")
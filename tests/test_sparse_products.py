@@ -0,0 +1,56 @@
+import pytest
+from pydantic import ValidationError
+
+import app
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("Brand Name: ACME Ceramic Vase", "ACME Ceramic Vase"),
+    ("SPECIFICATIONS Linen Table Runner", "Linen Table Runner"),
+    ("Ceramic Vase - Matte White", "Ceramic Vase"),
+    ("Ceramic Vase | Matte White", "Ceramic Vase"),
+    ("Ceramic Vase – Matte White", "Ceramic Vase"),
+    ("Ceramic Vase, Matte White, 20cm", "Ceramic Vase"),
+    ("Extra-Large Hand-Woven Cotton Rope Wall Hanging Decor", "Extra-Large Hand-Woven Cotton Rope Wall Hanging"),
+    ("  Ceramic   Vase  ", "Ceramic Vase"),
+])
+def test_shorten_title(title, expected):
+    assert app.shorten_title(title) == expected
+
+
+def test_shorten_title_keeps_one_word_head():
+    # A one-word head ("Vase") is too vague to stand alone, so the separator is kept.
+    assert app.shorten_title("Vase, Red") == "Vase, Red"
+
+
+@pytest.mark.parametrize("title", ["SPECIFICATIONS", "Brand Name:"])
+def test_shorten_title_falls_back_when_only_labels(title):
+    assert app.shorten_title(title) == title
+
+
+@pytest.mark.parametrize("title", ["", "   "])
+def test_shorten_title_blank(title):
+    assert app.shorten_title(title) == ""
+
+
+def test_is_sparse_product():
+    assert app.is_sparse_product("Ceramic Vase", "")
+    assert not app.is_sparse_product("Ceramic Vase", "x" * app.SHORT_CIRCUIT_MAX_BODY_CHARS)
+    assert not app.is_sparse_product("one two three four five six seven eight nine", "")
+
+
+def test_sparse_product_content():
+    content = app.sparse_product_content("Brand Name: ACME  Ceramic Vase")
+    assert content.displayName == "ACME Ceramic Vase"
+    assert content.displayDescription == "Brand Name: ACME Ceramic Vase"
+    assert content.bulletpoints is None
+
+
+@pytest.mark.parametrize("title", ["", "   ", "\n\t"])
+def test_product_request_rejects_blank_title(title):
+    with pytest.raises(ValidationError):
+        app.ProductRequest(title=title, body_html="")
+
+
+def test_product_request_strips_title():
+    assert app.ProductRequest(title="  Ceramic Vase ", body_html="").title == "Ceramic Vase"